@@ -1,4 +1,7 @@
+import hashlib
+import math
 import os
+import warnings
 
 from dataclasses import dataclass
 
@@ -89,6 +92,222 @@ class OpenFasta:
         return list(self)
 
 
+@dataclass
+class DuplicationStats:
+    """
+    Counts of reads seen by a ReadDeduplicator.
+
+    Attributes:
+        total (int): Number of reads or read pairs checked.
+        duplicates (int): Number of reads or read pairs reported as duplicates.
+        overflow (int): Number of unique reads stored after the Bloom filter capacity was reached.
+    """
+    total: int = 0
+    duplicates: int = 0
+    overflow: int = 0
+
+    @property
+    def unique(self) -> int:
+        """Return the number of reads or read pairs kept."""
+        return self.total - self.duplicates
+
+    @property
+    def duplication_rate(self) -> float:
+        """Return the fraction of reads or read pairs reported as duplicates."""
+        return self.duplicates / self.total if self.total else 0.0
+
+    def __str__(self) -> str:
+        message = f"{self.total} reads checked, {self.duplicates} duplicates removed ({self.duplication_rate:.2%})"
+        if self.overflow:
+            message += f", {self.overflow} unique reads past the Bloom filter capacity"
+        return message
+
+
+class _BloomFilter:
+    """
+    Fixed-size Bloom filter over pairs of 64-bit hashes, using double hashing.
+    """
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+        self.n_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+
+    def __contains__(self, hashes: tuple) -> bool:
+        """
+        Check whether all bits of a pair of 64-bit hashes are set, i.e. whether it was probably added.
+        """
+        high, low = hashes
+        bits, n_bits = self.bits, self.n_bits
+        for i in range(self.n_hashes):
+            bit = (high + i * low) % n_bits
+            if not bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def add(self, hashes: tuple) -> None:
+        """
+        Set the bits of a pair of 64-bit hashes.
+        """
+        high, low = hashes
+        bits, n_bits = self.bits, self.n_bits
+        for i in range(self.n_hashes):
+            bit = (high + i * low) % n_bits
+            bits[bit >> 3] |= 1 << (bit & 7)
+        self.count += 1
+
+
+class ReadDeduplicator:
+    """
+    Streaming filter that drops reads or read pairs whose sequences were already seen.
+
+    Sequences are hashed with BLAKE2b. In 'exact' mode the 128-bit hashes are kept in an
+    open-addressing table of 16-byte slots that starts small, doubles when it is half full and so
+    takes 32 to 64 bytes per unique read. In 'bloom' mode they are kept in a Bloom filter sized for
+    capacity reads, and a unique read is wrongly dropped with probability up to error_rate. Once
+    capacity unique reads are stored, the filter keeps its memory fixed and warns that the false
+    positive rate will rise (grow=False), or, with grow=True, chains a filter twice as large with half
+    the error rate, starting from error_rate / 4, so the rates sum to at most error_rate / 2 but memory
+    is unbounded. Reads past capacity are counted in stats.overflow.
+
+    Attributes:
+        mode (str): 'exact' or 'bloom'.
+        capacity (int): Expected number of unique reads, used to size the Bloom filter.
+        error_rate (float): False positive rate of the Bloom filter.
+        grow (bool): Whether the Bloom filter grows past capacity.
+        stats (DuplicationStats): Counts of reads checked so far.
+    """
+    _SLOT_SIZE = 16
+    _EMPTY_SLOT = bytes(_SLOT_SIZE)
+    _INITIAL_SLOTS = 1024
+
+    def __init__(self, mode: str = 'exact', capacity: int = 1_000_000, error_rate: float = 0.001,
+                 grow: bool = False):
+        if mode not in ('exact', 'bloom'):
+            raise ValueError(f"Unknown deduplication mode: {mode}")
+        self.mode = mode
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.grow = grow
+        self.stats = DuplicationStats()
+
+        if mode == 'exact':
+            self._table = bytearray(self._INITIAL_SLOTS * self._SLOT_SIZE)
+            self._filled = 0
+        else:
+            self._filters = [_BloomFilter(capacity, error_rate / 4 if grow else error_rate)]
+
+    @staticmethod
+    def _hash(sequence: str, mate: str = None) -> bytes:
+        """
+        Hash a read, or a read pair, into a non-zero 128-bit digest.
+        """
+        key = sequence.upper() if mate is None else f"{sequence}\0{mate}".upper()
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        return digest if digest != ReadDeduplicator._EMPTY_SLOT else b'\1' + digest[1:]
+
+    def _add_exact(self, digest: bytes) -> bool:
+        """
+        Insert a digest into the table. Returns True if it was already there.
+        """
+        table, slot_size = self._table, self._SLOT_SIZE
+        mask = len(table) // slot_size - 1
+        slot = int.from_bytes(digest[:8], 'little') & mask
+        while True:
+            start = slot * slot_size
+            stored = table[start:start + slot_size]
+            if stored == self._EMPTY_SLOT:
+                break
+            if stored == digest:
+                return True
+            slot = (slot + 1) & mask
+
+        table[start:start + slot_size] = digest
+        self._filled += 1
+        if 2 * self._filled > len(table) // slot_size:
+            self._grow_table()
+        return False
+
+    def _grow_table(self) -> None:
+        """
+        Double the hash table and reinsert the stored digests.
+        """
+        old_table, slot_size = self._table, self._SLOT_SIZE
+        self._table = bytearray(2 * len(old_table))
+        self._filled = 0
+        for start in range(0, len(old_table), slot_size):
+            digest = bytes(old_table[start:start + slot_size])
+            if digest != self._EMPTY_SLOT:
+                self._add_exact(digest)
+
+    def _add_bloom(self, digest: bytes) -> bool:
+        """
+        Insert a digest into the Bloom filter. Returns True if it was probably already there.
+        """
+        hashes = (int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1)
+        if any(hashes in bloom_filter for bloom_filter in self._filters):
+            return True
+
+        current = self._filters[-1]
+        if current.count >= current.capacity:
+            if self.grow:
+                current = _BloomFilter(2 * current.capacity, current.error_rate / 2)
+                self._filters.append(current)
+            elif not self.stats.overflow:
+                warnings.warn(f"Bloom filter capacity of {self.capacity} reads exceeded; unique reads will be "
+                              f"dropped at a rate above error_rate={self.error_rate}", RuntimeWarning)
+        if self.stats.unique >= self.capacity:
+            self.stats.overflow += 1
+        current.add(hashes)
+        return False
+
+    def is_duplicate(self, sequence: str, mate: str = None) -> bool:
+        """
+        Check whether a read or read pair was seen before, and remember it.
+
+        Args:
+            sequence (str): Read sequence.
+            mate (str, optional): Sequence of the mate read, for paired-end data. Defaults to None.
+
+        Returns:
+            bool: True if the read or read pair is a duplicate.
+        """
+        digest = self._hash(str(sequence), None if mate is None else str(mate))
+        duplicate = self._add_exact(digest) if self.mode == 'exact' else self._add_bloom(digest)
+        self.stats.total += 1
+        self.stats.duplicates += duplicate
+        return duplicate
+
+    def filter(self, records):
+        """
+        Yield the records whose sequences were not seen before.
+
+        Args:
+            records (iterable): FastaRecord or Biopython SeqRecord objects, or tuples of two of them
+                for read pairs.
+
+        Yields:
+            Records, or read pairs, that are not duplicates.
+        """
+        for record in records:
+            if isinstance(record, tuple):
+                read, mate = record
+                duplicate = self.is_duplicate(_record_sequence(read), _record_sequence(mate))
+            else:
+                duplicate = self.is_duplicate(_record_sequence(record))
+            if not duplicate:
+                yield record
+
+
+def _record_sequence(record) -> str:
+    """
+    Return the sequence of a FastaRecord or Biopython SeqRecord.
+    """
+    return record.sequence if isinstance(record, FastaRecord) else str(record.seq)
+
+
 def convert_multiline_fasta_to_oneline(input_fasta: str, output_fasta: str) -> str:
     """
     This function reads a multi-line FASTA file and converts it into a one-line FASTA format.
@@ -12,6 +12,8 @@ import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 
+from bio_files_processor import ReadDeduplicator
+
 load_dotenv()
 
 
@@ -357,41 +359,46 @@ def telegram_logger(chat_id: str):
 
 def filter_fastq(input_path: str, gc_lower_bound: float = 0, gc_upper_bound: float = 100,
                  length_lower_bound: float = 0, length_upper_bound: float = float('inf'),
-                 quality_threshold: int = 0, output_filename: str = None) -> None:
+                 quality_threshold: int = 0, output_filename: str = None,
+                 deduplicator: ReadDeduplicator = None) -> str:
     """
     Filters a FASTQ file based on GC content, sequence length, and quality threshold using Biopython.
+    Records are streamed from the input to the output file, so the file is never held in memory.
 
     Args:
     - input_path (str): Path to the input FASTQ file.
-    - gc_bounds (tuple): Tuple specifying the minimum and maximum GC content for filtering. Default is (0, 100).
-    - length_bounds (tuple): Tuple specifying the minimum and maximum sequence length for filtering. Default is (0, infinity).
+    - gc_lower_bound, gc_upper_bound (float): Minimum and maximum GC content in percent. Default is (0, 100).
+    - length_lower_bound, length_upper_bound (float): Minimum and maximum sequence length. Default is (0, infinity).
     - quality_threshold (float): Minimum quality score for filtering. Default is 0.
     - output_filename (str): Name of the output file. If None, the default filename will be used.
+    - deduplicator (ReadDeduplicator): If given, reads passing the filters whose sequences were already seen
+      are dropped, and duplication statistics are added to the message. Default is None.
 
     Returns:
     - str: Message indicating the success of the filtering process.
     """
-    filtered_seqs = []
-
-    with open(input_path, 'r') as fastq_file:
-        for record in SeqIO.parse(fastq_file, 'fastq'):
-            gc_content = gc_fraction(record.seq)
-            seq_length = len(record.seq)
-            quality_score = sum(record.letter_annotations["phred_quality"]) / seq_length
-
-            if (
-                gc_bounds[0] <= gc_content <= gc_bounds[1] and
-                length_bounds[0] <= seq_length <= length_bounds[1] and
-                quality_score >= quality_threshold
-            ):
-                filtered_seqs.append(record)
-
     if output_filename is None:
         output_filename = f"filtered_{input_path}"
     elif not output_filename.endswith('.fastq'):
         output_filename += '.fastq'
 
-    with open(output_filename, 'w') as output_file:
+    def passes_filters(record) -> bool:
+        gc_content = gc_fraction(record.seq) * 100
+        seq_length = len(record.seq)
+        quality_score = sum(record.letter_annotations["phred_quality"]) / seq_length
+        return (
+            gc_lower_bound <= gc_content <= gc_upper_bound and
+            length_lower_bound <= seq_length <= length_upper_bound and
+            quality_score >= quality_threshold
+        )
+
+    with open(input_path, 'r') as fastq_file, open(output_filename, 'w') as output_file:
+        filtered_seqs = filter(passes_filters, SeqIO.parse(fastq_file, 'fastq'))
+        if deduplicator is not None:
+            filtered_seqs = deduplicator.filter(filtered_seqs)
         SeqIO.write(filtered_seqs, output_file, 'fastq')
 
-    return "Filtered data was saved into output file"
\ No newline at end of file
+    message = "Filtered data was saved into output file"
+    if deduplicator is not None:
+        message += f"; {deduplicator.stats}"
+    return message
@@ -1,12 +1,795 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import uuid
+from multiprocessing import Pool
+
 from sklearn.base import BaseEstimator
 import numpy as np
-from multiprocessing import Pool
 from sklearn.tree import DecisionTreeClassifier
 
+
+class _SharedArray:
+    """
+    Memory-mapped view of an array that worker processes can open by file name.
+
+    Arrays that are already memory-mapped from a file (np.memmap or np.load with mmap_mode) are
+    shared as they are, without any copy. Other arrays are copied once into a temporary file, so
+    every worker maps the same physical pages instead of receiving a pickled copy. The copy goes to
+    /dev/shm when it has room for it and to the system temporary folder otherwise; /dev/shm is
+    RAM-backed, so for arrays close to the memory size pass an np.memmap instead. Arrays of Python
+    objects hold pointers that are meaningless in another process and cannot be shared.
+
+    Attributes:
+        filename (str): Path to the file backing the array.
+        dtype (str): Data type of the array.
+        shape (tuple): Shape of the array.
+        offset (int): Offset of the array data in the file, in bytes.
+        order (str): Memory layout of the array, 'C' or 'F'.
+        owned (bool): Whether the file is a temporary copy that close() should remove.
+    """
+    def __init__(self, array: np.ndarray, temp_folder: str = None):
+        if self._is_file_backed(array):
+            self.filename = array.filename
+            self.offset = array.offset
+            self.owned = False
+        else:
+            array = np.asanyarray(array)
+            if array.dtype.hasobject:
+                raise ValueError(f"Cannot share an array of dtype {array.dtype} with the workers; "
+                                 f"convert it to a numeric dtype first")
+            temp_folder = self._select_temp_folder(array.nbytes, temp_folder)
+            self.filename = os.path.join(temp_folder, f"rf_custom_{uuid.uuid4().hex}.dat")
+            self.offset = 0
+            self.owned = True
+
+        self.dtype = array.dtype.str
+        self.shape = array.shape
+        self.order = 'F' if array.flags.f_contiguous and not array.flags.c_contiguous else 'C'
+
+        if self.owned:
+            mapped = np.memmap(self.filename, dtype=self.dtype, mode='w+', shape=self.shape, order=self.order)
+            mapped[...] = array
+            mapped.flush()
+            del mapped
+
+    @staticmethod
+    def _is_file_backed(array) -> bool:
+        """
+        Check whether an array is a whole, contiguous np.memmap that can be reopened by file name.
+        """
+        return (
+            isinstance(array, np.memmap)
+            and isinstance(array.base, mmap.mmap)
+            and array.filename is not None
+            and (array.flags.c_contiguous or array.flags.f_contiguous)
+        )
+
+    @staticmethod
+    def _select_temp_folder(nbytes: int, temp_folder: str = None) -> str:
+        """
+        Choose a folder with enough free space for a copy of nbytes.
+
+        Writing past the free space of a tmpfs kills the process with SIGBUS instead of raising
+        an error, so the space is checked before the copy is made.
+
+        Args:
+            nbytes (int): Size of the array in bytes.
+            temp_folder (str, optional): Folder requested by the caller. Defaults to None.
+
+        Returns:
+            str: Folder for the temporary file.
+        """
+        if temp_folder is not None:
+            candidates = [temp_folder]
+        else:
+            candidates = [folder for folder in ('/dev/shm', tempfile.gettempdir()) if os.path.isdir(folder)]
+
+        for folder in candidates:
+            if shutil.disk_usage(folder).free > nbytes:
+                return folder
+        raise OSError(f"Not enough free space in {', '.join(candidates)} to share an array of {nbytes} bytes "
+                      f"with the workers; pass X as an np.memmap to avoid the copy")
+
+    def open(self) -> np.ndarray:
+        """
+        Map the shared array read-only into the current process.
+
+        Returns:
+            np.ndarray: Read-only memory-mapped array.
+        """
+        return np.memmap(self.filename, dtype=self.dtype, mode='r', offset=self.offset,
+                         shape=self.shape, order=self.order)
+
+    def close(self) -> None:
+        """
+        Remove the temporary copy of the array, if one was made.
+        """
+        if self.owned and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+def _tree_seed(entropy, tree_id):
+    """
+    Derive the seed of a tree from the forest entropy.
+
+    Every tree gets an independent stream that depends only on the forest entropy and its index,
+    so a tree draws the same bootstrap however many trees are grown together.
+
+    Args:
+        entropy (int): Entropy of the forest random state.
+        tree_id (int): Index of the tree in the forest.
+
+    Returns:
+        int: Seed of the tree.
+    """
+    return int(np.random.SeedSequence(entropy, spawn_key=(tree_id,)).generate_state(1, np.uint64)[0])
+
+
+def _draw_tree_sample(seed, n_samples, n_features, max_features):
+    """
+    Draw the features, bootstrap sample and tree random state of a tree from its seed.
+
+    Args:
+        seed (int): Seed of the tree.
+        n_samples (int): Number of training samples.
+        n_features (int): Number of features in the training data.
+        max_features (int): Number of features used by the tree, or None to use all of them.
+
+    Returns:
+        tuple: Feature indices, bootstrap sample indices and random state of the tree.
+    """
+    rng = np.random.default_rng(seed)
+    feat_ids = rng.choice(n_features, size=max_features or n_features, replace=False)
+    sample_indices = rng.integers(0, n_samples, size=n_samples)
+    tree_random_state = int(rng.integers(np.iinfo(np.int32).max))
+    return feat_ids, sample_indices, tree_random_state
+
+
+def _fit_tree(X, y, seed, max_depth, max_features):
+    """
+    Fit a single decision tree on a bootstrap sample of the data.
+
+    Args:
+        X (np.ndarray): Feature matrix of shape (n_samples, n_features).
+        y (np.ndarray): Target vector of shape (n_samples,).
+        seed (int): Seed for bootstrapping and feature sampling.
+        max_depth (int): Maximum depth of the tree.
+        max_features (int): Number of features used by the tree.
+
+    Returns:
+        tuple: Fitted DecisionTreeClassifier and array of feature indices used by the tree.
+    """
+    feat_ids, sample_indices, tree_random_state = _draw_tree_sample(seed, X.shape[0], X.shape[1], max_features)
+    X_bootstrap = X[np.ix_(sample_indices, feat_ids)]
+    y_bootstrap = y[sample_indices]
+
+    tree = DecisionTreeClassifier(max_depth=max_depth, random_state=tree_random_state)
+    tree.fit(X_bootstrap, y_bootstrap)
+
+    return tree, feat_ids
+
+
+def _bin_features(X, max_bins, subsample=200_000, random_state=0):
+    """
+    Quantise every feature into at most max_bins uint8 bins.
+
+    Bin edges are the midpoints between distinct values when a feature has few of them and
+    quantiles otherwise, computed on a random subsample of rows. A value x falls into the first bin b
+    with x <= edges[b], so a split on bins "bin <= b" is the same as "x <= edges[b]" on raw values.
+    The subsample is gathered once and X is then binned in blocks of rows, so a memory-mapped X is
+    read sequentially.
+
+    Args:
+        X (np.ndarray): Feature matrix of shape (n_samples, n_features).
+        max_bins (int): Maximum number of bins per feature, at most 256.
+        subsample (int, optional): Number of rows used to find the bin edges. Defaults to 200000.
+        random_state (int, optional): Seed of the row subsample. Defaults to 0.
+
+    Returns:
+        tuple: Binned matrix of shape (n_samples, n_features) in column-major order and bin edges
+            of shape (n_features, max_bins - 1) padded with inf.
+    """
+    if not 2 <= max_bins <= 256:
+        raise ValueError(f"max_bins must be between 2 and 256, got {max_bins}")
+
+    n_samples, n_features = X.shape
+    if n_samples > subsample:
+        sample_rows = np.sort(np.random.default_rng(random_state).choice(n_samples, size=subsample, replace=False))
+        sample = np.asfortranarray(X[sample_rows], dtype=np.float32)
+    else:
+        sample = np.asfortranarray(X, dtype=np.float32)
+
+    bin_edges = np.full((n_features, max_bins - 1), np.inf)
+    edges_by_feature = []
+    for feature in range(n_features):
+        values = sample[:, feature]
+        distinct = np.unique(values).astype(np.float64)
+        if len(distinct) <= max_bins:
+            edges = (distinct[:-1] + distinct[1:]) / 2
+        else:
+            edges = np.unique(np.quantile(values, np.linspace(0, 1, max_bins + 1)[1:-1]))
+        bin_edges[feature, :len(edges)] = edges
+        edges_by_feature.append(edges)
+    del sample
+
+    X_binned = np.empty((n_samples, n_features), dtype=np.uint8, order='F')
+    block_size = max(1, 2 ** 22 // max(n_features, 1))
+    for start in range(0, n_samples, block_size):
+        block = np.asfortranarray(X[start:start + block_size], dtype=np.float32)
+        for feature, edges in enumerate(edges_by_feature):
+            X_binned[start:start + len(block), feature] = np.searchsorted(edges, block[:, feature], side='left')
+
+    return X_binned, bin_edges
+
+
+@dataclass
+class HistogramTree:
+    """
+    Decision tree grown on binned features with histogram-based split search.
+
+    The node arrays follow the layout of sklearn's tree_ (children are -1 for leaves), and features
+    refer to the columns of the tree's feature subset, like the trees of the exact engine.
+
+    Attributes:
+        feature (np.ndarray): Feature tested at each node.
+        threshold (np.ndarray): Split threshold at each node; samples with X <= threshold go left.
+        children_left (np.ndarray): Index of the left child of each node.
+        children_right (np.ndarray): Index of the right child of each node.
+        value (np.ndarray): Weighted class counts of each node of shape (n_nodes, n_classes).
+        classes_ (np.ndarray): Indices of the forest classes that the columns of value refer to.
+        max_depth (int): Depth of the tree.
+    """
+    feature: np.ndarray
+    threshold: np.ndarray
+    children_left: np.ndarray
+    children_right: np.ndarray
+    value: np.ndarray
+    classes_: np.ndarray
+    max_depth: int
+
+    @property
+    def node_count(self) -> int:
+        """Return the number of nodes in the tree."""
+        return len(self.children_left)
+
+    @property
+    def missing_go_to_left(self) -> np.ndarray:
+        """Return whether missing values go left at each node; they fall into the last bin, so never."""
+        return np.zeros(self.node_count, dtype=np.uint8)
+
+    def predict_proba(self, X):
+        """
+        Predict class probabilities for the input samples.
+
+        Args:
+            X (np.ndarray): Feature matrix restricted to the tree's features.
+
+        Returns:
+            np.ndarray: Predicted class probabilities of shape (n_samples, n_classes).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))
+        nodes = np.zeros(len(X), dtype=np.intp)
+        for _ in range(self.max_depth):
+            is_leaf = self.children_left[nodes] < 0
+            go_left = X[rows, np.maximum(self.feature[nodes], 0)] <= self.threshold[nodes]
+            nodes = np.where(is_leaf, nodes, np.where(go_left, self.children_left[nodes], self.children_right[nodes]))
+        value = self.value[nodes]
+        return value / value.sum(axis=1, keepdims=True)
+
+
+def _build_histogram(X_binned, y_codes, rows, weights, feat_ids, n_bins, n_classes):
+    """
+    Build weighted class histograms of the binned features for the given rows.
+
+    Args:
+        X_binned (np.ndarray): Binned feature matrix.
+        y_codes (np.ndarray): Class index of every sample.
+        rows (np.ndarray): Rows of the node.
+        weights (np.ndarray): Bootstrap weight of each row.
+        feat_ids (np.ndarray): Features used by the tree.
+        n_bins (int): Number of bins.
+        n_classes (int): Number of classes.
+
+    Returns:
+        np.ndarray: Histogram of shape (n_tree_features, n_bins, n_classes).
+    """
+    histogram = np.empty((len(feat_ids), n_bins, n_classes))
+    y_rows = y_codes[rows][:, None]
+    block_size = max(1, 2 ** 20 // max(len(rows), 1))
+
+    for start in range(0, len(feat_ids), block_size):
+        block = feat_ids[start:start + block_size]
+        codes = X_binned[rows[:, None], block].astype(np.intp)
+        index = (np.arange(len(block)) * n_bins + codes) * n_classes + y_rows
+        block_weights = np.broadcast_to(weights[:, None], index.shape)
+        counts = np.bincount(index.ravel(), weights=block_weights.ravel(), minlength=len(block) * n_bins * n_classes)
+        histogram[start:start + len(block)] = counts.reshape(len(block), n_bins, n_classes)
+    return histogram
+
+
+def _best_histogram_split(histogram):
+    """
+    Find the split with the lowest weighted Gini impurity.
+
+    Args:
+        histogram (np.ndarray): Histogram of shape (n_tree_features, n_bins, n_classes).
+
+    Returns:
+        tuple: Feature position and bin of the best split, or None if no split lowers the impurity.
+    """
+    left = np.cumsum(histogram[:, :-1], axis=1)
+    total = histogram[0].sum(axis=0)
+    right = total - left
+    left_weight = left.sum(axis=2)
+    right_weight = total.sum() - left_weight
+
+    # Minimising the weighted Gini impurity is the same as maximising sum(counts ** 2) / weight
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score = np.einsum('fbc,fbc->fb', left, left) / left_weight + np.einsum('fbc,fbc->fb', right, right) / right_weight
+    score[(left_weight < 0.5) | (right_weight < 0.5)] = -np.inf
+
+    feature, bin_id = np.unravel_index(np.argmax(score), score.shape)
+    if score[feature, bin_id] <= (total ** 2).sum() / total.sum() * (1 + 1e-12):
+        return None
+    return feature, bin_id
+
+
+def _best_sorted_split(codes, y_rows, weights, n_classes):
+    """
+    Find the split with the lowest weighted Gini impurity in a node with few rows.
+
+    Searches the same splits as _best_histogram_split, but over the node's rows sorted by bin
+    instead of over all bins, which is cheaper when the node has fewer rows than there are bins.
+
+    Args:
+        codes (np.ndarray): Bins of the node's rows of shape (n_rows, n_tree_features).
+        y_rows (np.ndarray): Class index of the node's rows.
+        weights (np.ndarray): Bootstrap weight of the node's rows.
+        n_classes (int): Number of classes.
+
+    Returns:
+        tuple: Feature position and bin of the best split, or None if no split lowers the impurity.
+    """
+    order = np.argsort(codes, axis=0, kind='stable')
+    sorted_codes = np.take_along_axis(codes, order, axis=0)
+    class_weights = np.zeros((len(y_rows), n_classes))
+    class_weights[np.arange(len(y_rows)), y_rows] = weights
+
+    left = np.cumsum(class_weights[order], axis=0)[:-1]
+    total = class_weights.sum(axis=0)
+    right = total - left
+    left_weight = left.sum(axis=2)
+    right_weight = total.sum() - left_weight
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score = np.einsum('rfc,rfc->fr', left, left) / left_weight.T + np.einsum('rfc,rfc->fr', right, right) / right_weight.T
+    # A split is only possible between rows that fall into different bins
+    score[(sorted_codes[:-1] == sorted_codes[1:]).T] = -np.inf
+
+    feature, position = np.unravel_index(np.argmax(score), score.shape)
+    if score[feature, position] <= (total ** 2).sum() / total.sum() * (1 + 1e-12):
+        return None
+    return feature, sorted_codes[position, feature]
+
+
+def _fit_histogram_tree(X_binned, y_codes, bin_edges, seed, max_depth, max_features, n_classes):
+    """
+    Grow a single decision tree on the binned data, weighting rows by their bootstrap counts.
+
+    Histograms are sized by the largest bin count among the tree's features. Only the histogram of
+    the smaller child of every split is built; the other one is obtained by subtracting it from the
+    parent histogram. Nodes with fewer rows than bins skip histograms and search splits over their
+    sorted rows instead.
+
+    Args:
+        X_binned (np.ndarray): Binned feature matrix of shape (n_samples, n_features).
+        y_codes (np.ndarray): Class index of every sample.
+        bin_edges (np.ndarray): Bin edges of every feature.
+        seed (int): Seed for bootstrapping and feature sampling.
+        max_depth (int): Maximum depth of the tree.
+        max_features (int): Number of features used by the tree.
+        n_classes (int): Number of classes of the forest.
+
+    Returns:
+        tuple: Fitted HistogramTree and array of feature indices used by the tree.
+    """
+    feat_ids, sample_indices, _ = _draw_tree_sample(seed, X_binned.shape[0], X_binned.shape[1], max_features)
+    n_bins = int(np.isfinite(bin_edges[feat_ids]).sum(axis=1).max()) + 1
+
+    def node_histogram(rows, weights):
+        if len(rows) < n_bins:
+            return None
+        return _build_histogram(X_binned, y_codes, rows, weights, feat_ids, n_bins, n_classes)
+
+    counts = np.bincount(sample_indices, minlength=X_binned.shape[0])
+    rows = np.flatnonzero(counts)
+    weights = counts[rows].astype(np.float64)
+
+    feature, threshold, children_left, children_right, value = [], [], [], [], []
+    tree_depth = 0
+    stack = [(rows, weights, node_histogram(rows, weights), 0, -1, False)]
+
+    while stack:
+        rows, weights, histogram, depth, parent, is_left = stack.pop()
+        node_id = len(value)
+        if parent >= 0:
+            (children_left if is_left else children_right)[parent] = node_id
+        tree_depth = max(tree_depth, depth)
+
+        if histogram is None:
+            class_counts = np.bincount(y_codes[rows], weights=weights, minlength=n_classes)
+        else:
+            class_counts = histogram[0].sum(axis=0)
+        feature.append(-2)
+        threshold.append(-2.0)
+        children_left.append(-1)
+        children_right.append(-1)
+        value.append(class_counts)
+
+        if (max_depth is not None and depth >= max_depth) or np.count_nonzero(class_counts) < 2:
+            continue
+        if histogram is None:
+            codes = X_binned[rows[:, None], feat_ids]
+            split = _best_sorted_split(codes, y_codes[rows], weights, n_classes)
+        else:
+            split = _best_histogram_split(histogram)
+        if split is None:
+            continue
+
+        split_feature, split_bin = split
+        feature[node_id] = split_feature
+        threshold[node_id] = bin_edges[feat_ids[split_feature], split_bin]
+
+        go_left = X_binned[rows, feat_ids[split_feature]] <= split_bin
+        children = [(rows[go_left], weights[go_left]), (rows[~go_left], weights[~go_left])]
+        small = 0 if len(children[0][0]) <= len(children[1][0]) else 1
+        histograms = [None, None]
+        if histogram is not None and len(children[1 - small][0]) >= n_bins:
+            small_histogram = _build_histogram(X_binned, y_codes, *children[small], feat_ids, n_bins, n_classes)
+            histograms[1 - small] = histogram - small_histogram
+            if len(children[small][0]) >= n_bins:
+                histograms[small] = small_histogram
+
+        stack.append((*children[1], histograms[1], depth + 1, node_id, False))
+        stack.append((*children[0], histograms[0], depth + 1, node_id, True))
+
+    tree = HistogramTree(
+        feature=np.asarray(feature, dtype=np.intp),
+        threshold=np.asarray(threshold, dtype=np.float64),
+        children_left=np.asarray(children_left, dtype=np.intp),
+        children_right=np.asarray(children_right, dtype=np.intp),
+        value=np.asarray(value),
+        classes_=np.arange(n_classes),
+        max_depth=tree_depth,
+    )
+    return tree, feat_ids
+
+
+def _fit_tree_worker(args):
+    """
+    Fit a single tree in a worker process on the shared training data.
+
+    Args:
+        args (tuple): Tuple containing the tree fitting function, the tree seed, the shared training
+            arrays and tree parameters.
+
+    Returns:
+        tuple: Fitted tree and array of feature indices used by the tree.
+    """
+    fit_function, seed, shared_arrays, params = args
+    return fit_function(*[shared.open() for shared in shared_arrays], seed, **params)
+
+
+FOREST_FILE_MAGIC = b'RFCF'
+FOREST_FILE_VERSION = 1
+_FOREST_FILE_ALIGNMENT = 64
+_FOREST_ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots', 'feat_ids_by_tree')
+
+
+def _json_default(value):
+    """
+    Convert NumPy scalars and arrays in the forest file header to JSON types.
+    """
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _sibling_order(children_left, children_right):
+    """
+    Order the nodes of a tree level by level with the two children of every node next to each other.
+
+    Args:
+        children_left (np.ndarray): Index of the left child of each node (-1 for leaves).
+        children_right (np.ndarray): Index of the right child of each node (-1 for leaves).
+
+    Returns:
+        np.ndarray: Node indices in the new order, starting with the root.
+    """
+    levels = [np.zeros(1, dtype=np.intp)]
+    while len(levels[-1]):
+        split_nodes = levels[-1][children_left[levels[-1]] >= 0]
+        levels.append(np.column_stack([children_left[split_nodes], children_right[split_nodes]]).ravel())
+    return np.concatenate(levels)
+
+
+class CompiledForest:
+    """
+    Fitted forest compiled into flat NumPy node arrays for fast in-process inference.
+
+    The nodes of all trees are stored in shared arrays, and the feature indices already refer to
+    the columns of the full feature matrix, so feat_ids_by_tree does not have to be applied at
+    prediction time. Nodes are numbered level by level with the two children of a node next to each
+    other, so a sample that goes right simply moves to left + 1. Leaves point to themselves and have
+    an infinite threshold, which lets a whole batch walk all trees at once without branching.
+
+    A compiled forest can be saved to a single file with save(). The file starts with the magic
+    bytes, the format version and the length of a JSON header describing the arrays, followed by the
+    raw node arrays, each aligned to 64 bytes. load() memory-maps the file, so loading takes the same
+    time for any forest size and processes loading the same file share its pages.
+
+    Attributes:
+        feature (np.ndarray): Feature tested at each node (0 for leaves).
+        threshold (np.ndarray): Split threshold at each node; samples with X <= threshold go left.
+        left (np.ndarray): Index of the left child of each node.
+        right (np.ndarray): Index of the right child of each node, always left + 1 for split nodes.
+        missing_left (np.ndarray): Whether samples with a missing (NaN) value go left at each node.
+        value (np.ndarray): Class probabilities of each node of shape (n_nodes, n_classes).
+        roots (np.ndarray): Index of the root node of each tree.
+        feat_ids_by_tree (np.ndarray): Feature indices used by each tree.
+        classes_ (np.ndarray): Classes of the forest.
+        max_depth (int): Depth of the deepest tree.
+        n_features (int): Number of features of the training data.
+    """
+    def __init__(self, feature, threshold, left, right, missing_left, value, roots, feat_ids_by_tree, classes,
+                 max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.feat_ids_by_tree = feat_ids_by_tree
+        self.classes_ = classes
+        self.max_depth = max_depth
+        self.n_features = n_features
+
+    @classmethod
+    def from_trees(cls, trees, feat_ids_by_tree, classes, n_features):
+        """
+        Compile fitted decision trees into flat node arrays.
+
+        Args:
+            trees (list): Fitted DecisionTreeClassifier or HistogramTree models.
+            feat_ids_by_tree (list): Feature indices used by each tree.
+            classes (list): Classes of the forest.
+            n_features (int): Number of features of the training data.
+
+        Returns:
+            CompiledForest: Compiled forest.
+        """
+        classes = np.asarray(classes)
+        features, thresholds, lefts, rights, missing_lefts, values, roots = [], [], [], [], [], [], []
+        n_nodes = 0
+        max_depth = 0
+
+        for tree, feat_ids in zip(trees, feat_ids_by_tree):
+            tree_ = tree if isinstance(tree, HistogramTree) else tree.tree_
+            order = _sibling_order(tree_.children_left, tree_.children_right)
+            node_ids = np.empty(tree_.node_count, dtype=np.intp)
+            node_ids[order] = np.arange(tree_.node_count)
+            is_leaf = tree_.children_left[order] < 0
+
+            features.append(np.where(is_leaf, 0, np.asarray(feat_ids)[np.maximum(tree_.feature[order], 0)]))
+            thresholds.append(np.where(is_leaf, np.inf, tree_.threshold[order]))
+            lefts.append(np.where(is_leaf, np.arange(tree_.node_count), node_ids[tree_.children_left[order]]) + n_nodes)
+            rights.append(np.where(is_leaf, lefts[-1], lefts[-1] + 1))
+            missing_lefts.append(is_leaf | (tree_.missing_go_to_left[order] != 0))
+
+            # Trees are fitted on class indices, and a tree only knows the classes of its bootstrap sample
+            tree_value = np.zeros((tree_.node_count, len(classes)))
+            tree_value[:, tree.classes_] = tree_.value[order].reshape(tree_.node_count, -1)
+            values.append(tree_value / tree_value.sum(axis=1, keepdims=True))
+
+            roots.append(n_nodes)
+            n_nodes += tree_.node_count
+            max_depth = max(max_depth, tree_.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            missing_left=np.concatenate(missing_lefts),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int32),
+            feat_ids_by_tree=np.asarray(feat_ids_by_tree),
+            classes=classes,
+            max_depth=max_depth,
+            n_features=n_features,
+        )
+
+    def save(self, path, params=None):
+        """
+        Save the compiled forest to a file.
+
+        Args:
+            path (str): Path to the output file.
+            params (dict, optional): Estimator parameters stored alongside the forest. Defaults to None.
+        """
+        arrays = {name: np.ascontiguousarray(getattr(self, name)) for name in _FOREST_ARRAYS}
+        header = {
+            'classes': self.classes_.tolist(),
+            'max_depth': int(self.max_depth),
+            'n_features': int(self.n_features),
+            'params': params or {},
+            'arrays': {},
+        }
+        offset = 0
+        for name, array in arrays.items():
+            header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += -(-array.nbytes // _FOREST_FILE_ALIGNMENT) * _FOREST_FILE_ALIGNMENT
+
+        header_bytes = json.dumps(header, default=_json_default).encode()
+        prefix = FOREST_FILE_MAGIC + struct.pack('<HI', FOREST_FILE_VERSION, len(header_bytes)) + header_bytes
+        data_start = -(-len(prefix) // _FOREST_FILE_ALIGNMENT) * _FOREST_FILE_ALIGNMENT
+
+        with open(path, 'wb') as forest_file:
+            forest_file.write(prefix.ljust(data_start, b'\0'))
+            for name, array in arrays.items():
+                forest_file.seek(data_start + header['arrays'][name]['offset'])
+                forest_file.write(array.tobytes())
+
+    @staticmethod
+    def read_header(path):
+        """
+        Read the JSON header of a saved forest file.
+
+        Args:
+            path (str): Path to the forest file.
+
+        Returns:
+            tuple: Parsed header and the offset of the array data in the file.
+        """
+        with open(path, 'rb') as forest_file:
+            magic = forest_file.read(len(FOREST_FILE_MAGIC))
+            if magic != FOREST_FILE_MAGIC:
+                raise ValueError(f"{path} is not a compiled forest file")
+            version, header_length = struct.unpack('<HI', forest_file.read(struct.calcsize('<HI')))
+            if version != FOREST_FILE_VERSION:
+                raise ValueError(f"Unsupported forest file version: {version}")
+            header = json.loads(forest_file.read(header_length))
+        prefix_length = len(FOREST_FILE_MAGIC) + struct.calcsize('<HI') + header_length
+        return header, -(-prefix_length // _FOREST_FILE_ALIGNMENT) * _FOREST_FILE_ALIGNMENT
+
+    @classmethod
+    def load(cls, path, mmap_mode='r', return_header=False):
+        """
+        Load a compiled forest saved with save().
+
+        Args:
+            path (str): Path to the forest file.
+            mmap_mode (str, optional): Memory-map mode of the file, or None to read the arrays into
+                memory. Defaults to 'r'.
+            return_header (bool, optional): Whether to also return the parsed file header, which holds
+                the estimator parameters. Defaults to False.
+
+        Returns:
+            CompiledForest: Loaded forest, or a tuple of the forest and the header if return_header is True.
+        """
+        header, data_start = cls.read_header(path)
+        if mmap_mode is None:
+            with open(path, 'rb') as forest_file:
+                buffer = np.frombuffer(forest_file.read(), dtype=np.uint8)
+        else:
+            buffer = np.memmap(path, dtype=np.uint8, mode=mmap_mode)
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            arrays[name] = np.ndarray(tuple(spec['shape']), dtype=np.dtype(spec['dtype']), buffer=buffer,
+                                      offset=data_start + spec['offset'])
+
+        compiled = cls(classes=np.asarray(header['classes']), max_depth=header['max_depth'],
+                       n_features=header['n_features'], **arrays)
+        return (compiled, header) if return_header else compiled
+
+    @property
+    def n_trees(self) -> int:
+        """Return the number of trees in the forest."""
+        return len(self.roots)
+
+    def _check_input(self, X):
+        """
+        Convert X to a float32 matrix and check that it has the training number of features.
+
+        Args:
+            X (np.ndarray): Feature matrix of shape (n_samples, n_features).
+
+        Returns:
+            np.ndarray: C-contiguous float32 feature matrix.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2D feature matrix, got an array with {X.ndim} dimension(s)")
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the forest was fitted on {self.n_features} features")
+        return X
+
+    def apply(self, X, roots=None):
+        """
+        Find the leaf reached by every sample in every tree.
+
+        All (tree, sample) pairs move down one level per step. Pairs that reached a leaf are dropped
+        every few steps, so the work follows the length of the actual paths instead of max_depth.
+        Missing values are routed like sklearn does, by missing_left.
+
+        Args:
+            X (np.ndarray): Feature matrix of shape (n_samples, n_features).
+            roots (np.ndarray, optional): Root nodes of the trees to evaluate. Defaults to all trees.
+
+        Returns:
+            np.ndarray: Leaf indices of shape (n_trees, n_samples).
+        """
+        X = self._check_input(X)
+        roots = self.roots if roots is None else roots
+        values = X.ravel()
+        has_missing = np.isnan(values).any()
+
+        leaves = np.repeat(roots[:, None], len(X), axis=1).ravel()
+        pairs = np.arange(len(leaves))
+        offsets = np.tile(np.arange(len(X)) * X.shape[1], len(roots))
+        nodes = leaves.copy()
+        step = 0
+        while len(pairs):
+            x = values.take(offsets + self.feature.take(nodes))
+            go_right = x > self.threshold.take(nodes)
+            if has_missing:
+                go_right |= np.isnan(x) & ~self.missing_left.take(nodes)
+            children = self.left.take(nodes) + go_right
+
+            step += 1
+            if step % 4 == 0:
+                moved = children != nodes
+                leaves[pairs[~moved]] = nodes[~moved]
+                pairs, offsets, children = pairs[moved], offsets[moved], children[moved]
+            nodes = children
+        return leaves.reshape(len(roots), len(X))
+
+    def predict_proba(self, X, chunk_size=1024):
+        """
+        Predict class probabilities by averaging over all trees.
+
+        Args:
+            X (np.ndarray): Feature matrix of shape (n_samples, n_features).
+            chunk_size (int, optional): Number of rows evaluated at once. Defaults to 1024.
+
+        Returns:
+            np.ndarray: Predicted class probabilities of shape (n_samples, n_classes).
+        """
+        X = self._check_input(X)
+        probas = np.empty((len(X), len(self.classes_)))
+        for start in range(0, len(X), chunk_size):
+            leaves = self.apply(X[start:start + chunk_size])
+            probas[start:start + chunk_size] = self.value[leaves].mean(axis=0)
+        return probas
+
+
 class RandomForestClassifierCustom(BaseEstimator):
     """
     Custom implementation of RandomForestClassifier using multiprocessing.
 
+    Training data are memory-mapped once and only their file names are sent to the workers, and the
+    worker pool is kept alive between calls. Call close() (or use the forest as a context manager)
+    to shut the pool down. Prediction runs in-process on the forest compiled into a CompiledForest.
+
     Args:
         n_estimators (int, optional): Number of trees in the forest. Defaults to 10.
         max_depth (int, optional): Maximum depth of the tree. Defaults to None.
@@ -14,82 +797,253 @@ class RandomForestClassifierCustom(BaseEstimator):
             Defaults to None.
         random_state (int, optional): Controls both the randomness of the bootstrapping of the samples
             used when building trees and the sampling of the features to consider when looking for
-            the best split at each node. Defaults to None.
+            the best split at each node. Each tree draws from its own stream derived from it. Defaults to None.
+        oob_score (bool, optional): Whether to compute the out-of-bag score after fitting. Defaults to False.
+        warm_start (bool, optional): Whether fit adds trees to the already fitted forest instead of
+            growing a new one. Defaults to False.
+        engine (str, optional): Tree training engine. 'exact' fits sklearn DecisionTreeClassifier models
+            on bootstrap copies of the data; 'hist' quantises the features into uint8 bins once and grows
+            HistogramTree models with histogram split search and bootstrap weights. Defaults to 'exact'.
+        max_bins (int, optional): Maximum number of bins per feature of the 'hist' engine, at most 256.
+            Defaults to 256.
 
     Attributes:
         classes_ (list): List of classes found during fitting.
-        trees (list): List of fitted DecisionTreeClassifier models.
+        n_features_in_ (int): Number of features seen during fitting.
+        trees (list): List of fitted DecisionTreeClassifier or HistogramTree models.
         feat_ids_by_tree (list): List of feature indices used by each tree.
+        seeds_by_tree (list): Seed of each tree, from which its features and bootstrap sample are redrawn.
+        oob_score_ (float): Accuracy of the out-of-bag predictions, if oob_score is True.
+        oob_decision_function_ (np.ndarray): Out-of-bag class probabilities of the training samples,
+            if oob_score is True. Samples that are in every bootstrap get NaN.
     """
     def __init__(
-        self, n_estimators=10, max_depth=None, max_features=None, random_state=None
+        self, n_estimators=10, max_depth=None, max_features=None, random_state=None,
+        oob_score=False, warm_start=False, engine='exact', max_bins=256
     ):
         self.n_estimators = n_estimators
         self.max_depth = max_depth
         self.max_features = max_features
         self.random_state = random_state
+        self.oob_score = oob_score
+        self.warm_start = warm_start
+        self.engine = engine
+        self.max_bins = max_bins
 
         self.trees = []
         self.feat_ids_by_tree = []
+        self.seeds_by_tree = []
+        self._entropy = None
+        self._pool = None
+        self._pool_size = None
+        self._compiled = None
+
+    def __enter__(self):
+        return self
 
-    def _fit_tree(self, args):
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_pool'] = None
+        state['_pool_size'] = None
+        if self.trees:
+            state['_compiled'] = None
+        return state
+
+    def _get_pool(self, n_jobs):
         """
-        Fit a single decision tree on a bootstrap sample of the data.
+        Return the persistent worker pool, starting it if needed.
 
         Args:
-            args (tuple): Tuple containing tree_id, feature matrix X, and target vector y.
+            n_jobs (int): Number of worker processes.
 
         Returns:
-            tuple: Fitted DecisionTreeClassifier and array of feature indices used by the tree.
+            multiprocessing.pool.Pool: Worker pool of size n_jobs.
         """
-        tree_id, X, y = args
-        np.random.seed(self.random_state)
-        feat_ids = np.random.choice(range(X.shape[1]), size=self.max_features, replace=False)
-
-        sample_indices = np.random.choice(range(len(X)), size=len(X), replace=True)
-        X_bootstrap = X[sample_indices][:, feat_ids]
-        y_bootstrap = y[sample_indices]
-
-        tree = DecisionTreeClassifier(max_depth=self.max_depth, random_state=self.random_state + tree_id)
-        tree.fit(X_bootstrap, y_bootstrap)
+        if self._pool is None or self._pool_size != n_jobs:
+            self.close()
+            self._pool = Pool(n_jobs)
+            self._pool_size = n_jobs
+        return self._pool
 
-        return tree, feat_ids
+    def close(self):
+        """
+        Shut down the persistent worker pool.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+            self._pool_size = None
 
     def fit(self, X, y, n_jobs=1):
         """
         Fit the random forest classifier on the training data.
 
+        With warm_start, only the trees missing up to n_estimators are fitted and appended to the forest.
+
         Args:
-            X (np.ndarray): Feature matrix of shape (n_samples, n_features).
+            X (np.ndarray): Feature matrix of shape (n_samples, n_features). An np.memmap is shared
+                with the workers without being copied.
             y (np.ndarray): Target vector of shape (n_samples,).
-            n_jobs (int, optional): Number of jobs to run in parallel. Defaults to 1.
+            n_jobs (int, optional): Number of jobs to run in parallel, or None to use all CPUs. Defaults to 1.
 
         Returns:
             RandomForestClassifierCustom: Fitted random forest classifier.
         """
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        if n_jobs < 1:
+            raise ValueError(f"n_jobs must be a positive integer or None, got {n_jobs}")
+        if self.engine not in ('exact', 'hist'):
+            raise ValueError(f"Unknown engine: {self.engine}")
+        if self.warm_start and self._compiled is not None and not self.trees:
+            raise ValueError("Cannot warm start a forest loaded from disk")
+        if self.warm_start and self.trees and X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the forest was fitted on {self.n_features_in_} features")
+        if self.warm_start and self.trees and not np.array_equal(np.unique(y), self.classes_):
+            raise ValueError(f"y has classes {np.unique(y).tolist()}, but the forest was fitted on classes "
+                             f"{list(self.classes_)}")
+        if not self.warm_start or not self.trees:
+            self.trees, self.feat_ids_by_tree, self.seeds_by_tree = (), (), ()
+            self._entropy = self.random_state if self.random_state is not None else np.random.SeedSequence().entropy
+        if self.n_estimators < len(self.trees):
+            raise ValueError(f"n_estimators={self.n_estimators} must be at least the number of fitted trees "
+                             f"({len(self.trees)}) when warm_start is True")
+
         self.classes_ = sorted(np.unique(y))
+        self.n_features_in_ = X.shape[1]
+        params = {
+            'max_depth': self.max_depth,
+            'max_features': self.max_features,
+        }
+        seeds = [_tree_seed(self._entropy, i) for i in range(len(self.trees), self.n_estimators)]
 
-        with Pool(n_jobs) as pool:
-            results = pool.map(self._fit_tree, [(i, X, y) for i in range(self.n_estimators)])
+        # Trees are fitted on class indices, so labels of any dtype can be shared with the workers
+        y_codes = np.searchsorted(np.asarray(self.classes_), y)
+        if self.engine == 'hist':
+            fit_function = _fit_histogram_tree
+            X_binned, bin_edges = _bin_features(X, self.max_bins)
+            arrays = (X_binned, y_codes, bin_edges)
+            params['n_classes'] = len(self.classes_)
+        else:
+            fit_function = _fit_tree
+            arrays = (X, y_codes)
 
-        self.trees, self.feat_ids_by_tree = zip(*results)
+        if n_jobs == 1:
+            results = [fit_function(*arrays, seed, **params) for seed in seeds]
+        else:
+            shared_arrays = [_SharedArray(array) for array in arrays]
+            try:
+                pool = self._get_pool(n_jobs)
+                results = pool.map(_fit_tree_worker, [(fit_function, seed, shared_arrays, params) for seed in seeds])
+            finally:
+                for shared in shared_arrays:
+                    shared.close()
+
+        if results:
+            trees, feat_ids_by_tree = zip(*results)
+            self.trees = tuple(self.trees) + trees
+            self.feat_ids_by_tree = tuple(self.feat_ids_by_tree) + feat_ids_by_tree
+            self.seeds_by_tree = tuple(self.seeds_by_tree) + tuple(seeds)
+        self._compiled = None
+
+        if self.oob_score:
+            self._set_oob_score(X, y, n_jobs)
 
         return self
 
-    def _predict_proba_single_tree(self, args):
+    def _set_oob_score(self, X, y, n_jobs=1, chunk_size=8192):
         """
-        Predict class probabilities for a single tree.
+        Compute the out-of-bag predictions and score of the fitted forest.
+
+        The bootstrap sample of every tree is redrawn from its seed, and each tree is evaluated on
+        the compiled forest for the samples it did not see, one chunk of rows at a time, so X is never
+        copied as a whole. Groups of trees are processed in threads, each accumulating probability
+        sums and vote counts for all samples.
 
         Args:
-            args (tuple): Tuple containing a fitted tree, feature indices, and feature matrix X.
+            X (np.ndarray): Feature matrix of shape (n_samples, n_features).
+            y (np.ndarray): Target vector of shape (n_samples,).
+            n_jobs (int, optional): Number of threads. Defaults to 1.
+            chunk_size (int, optional): Number of rows evaluated at once. Defaults to 8192.
+        """
+        compiled = self.compile()
+        n_samples, n_features = X.shape
+
+        def accumulate(tree_ids):
+            proba_sums = np.zeros((n_samples, len(self.classes_)))
+            counts = np.zeros(n_samples)
+            for tree_id in tree_ids:
+                _, sample_indices, _ = _draw_tree_sample(self.seeds_by_tree[tree_id], n_samples, n_features, self.max_features)
+                is_oob = np.bincount(sample_indices, minlength=n_samples) == 0
+                for start in range(0, n_samples, chunk_size):
+                    oob_rows = start + np.flatnonzero(is_oob[start:start + chunk_size])
+                    leaves = compiled.apply(X[oob_rows], roots=compiled.roots[[tree_id]])[0]
+                    proba_sums[oob_rows] += compiled.value[leaves]
+                    counts[oob_rows] += 1
+            return proba_sums, counts
+
+        tree_groups = np.array_split(np.arange(len(self.trees)), n_jobs)
+        with ThreadPoolExecutor(n_jobs) as executor:
+            results = list(executor.map(accumulate, tree_groups))
+
+        proba_sums = np.sum([proba_sum for proba_sum, _ in results], axis=0)
+        counts = np.sum([count for _, count in results], axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.oob_decision_function_ = proba_sums / counts[:, None]
+
+        has_oob = counts > 0
+        oob_predictions = np.asarray(self.classes_)[np.argmax(proba_sums[has_oob], axis=1)]
+        self.oob_score_ = np.mean(oob_predictions == np.asarray(y)[has_oob])
+
+    def compile(self):
+        """
+        Compile the fitted trees into flat node arrays for fast inference.
 
         Returns:
-            np.ndarray: Predicted class probabilities for the input samples.
+            CompiledForest: Compiled forest, cached until the next fit.
         """
-        tree, feat_ids, X = args
-        X_subset = X[:, feat_ids]
-        tree_probas = tree.predict_proba(X_subset)
-        return tree_probas
+        if self._compiled is None:
+            self._compiled = CompiledForest.from_trees(self.trees, self.feat_ids_by_tree, self.classes_,
+                                                       self.n_features_in_)
+        return self._compiled
+
+    def save(self, path):
+        """
+        Save the fitted forest in the compiled forest format.
+
+        Args:
+            path (str): Path to the output file.
+        """
+        self.compile().save(path, params=self.get_params())
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load a forest saved with save().
+
+        The loaded forest predicts from the memory-mapped node arrays and has no sklearn trees.
+
+        Args:
+            path (str): Path to the forest file.
+            mmap_mode (str, optional): Memory-map mode of the file, or None to read the arrays into
+                memory. Defaults to 'r'.
+
+        Returns:
+            RandomForestClassifierCustom: Loaded random forest classifier.
+        """
+        compiled, header = CompiledForest.load(path, mmap_mode, return_header=True)
+
+        forest = cls(**header['params'])
+        forest.classes_ = compiled.classes_.tolist()
+        forest.trees = ()
+        forest.feat_ids_by_tree = tuple(compiled.feat_ids_by_tree)
+        forest.n_features_in_ = compiled.n_features
+        forest._compiled = compiled
+        return forest
 
     def predict_proba(self, X, n_jobs=1):
         """
@@ -97,16 +1051,13 @@ class RandomForestClassifierCustom(BaseEstimator):
 
         Args:
             X (np.ndarray): Feature matrix of shape (n_samples, n_features).
-            n_jobs (int, optional): Number of jobs to run in parallel. Defaults to 1.
+            n_jobs (int, optional): Unused, prediction runs in the calling process. Kept for compatibility.
+                Defaults to 1.
 
         Returns:
             np.ndarray: Predicted class probabilities of shape (n_samples, n_classes).
         """
-        with Pool(n_jobs) as pool:
-            tree_proba_list = pool.map(self._predict_proba_single_tree, [(tree, feat_ids, X) for tree, feat_ids in zip(self.trees, self.feat_ids_by_tree)])
-
-        probas = np.sum(tree_proba_list, axis=0) / self.n_estimators
-        return probas
+        return self.compile().predict_proba(X)
 
     def predict(self, X, n_jobs=1):
         """
@@ -114,7 +1065,8 @@ class RandomForestClassifierCustom(BaseEstimator):
 
         Args:
             X (np.ndarray): Feature matrix of shape (n_samples, n_features).
-            n_jobs (int, optional): Number of jobs to run in parallel. Defaults to 1.
+            n_jobs (int, optional): Unused, prediction runs in the calling process. Kept for compatibility.
+                Defaults to 1.
 
         Returns:
             np.ndarray: Predicted class labels of shape (n_samples,).
@@ -2,12 +2,16 @@ import inspect
 import os
 import re
 import tempfile
+from types import SimpleNamespace
 from typing import List, Tuple
 
+import numpy as np
 import pytest
 
-from bio_files_processor import OpenFasta, FastaRecord, convert_multiline_fasta_to_oneline
-from bioseq import DNASequence, RNASequence, AminoAcidSequence, run_genscan
+from bio_files_processor import OpenFasta, FastaRecord, ReadDeduplicator, convert_multiline_fasta_to_oneline
+from bioseq import DNASequence, RNASequence, AminoAcidSequence, filter_fastq, run_genscan
+import custom_random_forest
+from custom_random_forest import RandomForestClassifierCustom
 
 
 class TestDNASequence:
@@ -117,6 +121,102 @@ class TestFastaProcessing:
                 assert record == expected_record
 
 
+class TestReadDeduplicator:
+    """
+    Test the ReadDeduplicator class.
+    """
+    @pytest.fixture
+    def records(self) -> List[FastaRecord]:
+        """
+        Fixture providing FASTA records with repeated sequences.
+        """
+        sequences = ["ATGC", "GATTACA", "atgc", "TTAA", "GATTACA"] + [f"ACGT{i:05d}" for i in range(500)]
+        return [FastaRecord(f"read{i}", "", sequence) for i, sequence in enumerate(sequences)]
+
+    @pytest.fixture
+    def unique_reads(self) -> List[str]:
+        """
+        Fixture providing 20000 distinct random reads.
+        """
+        rng = np.random.default_rng(0)
+        reads = {"".join(rng.choice(list("ACGT"), size=50)) for _ in range(20000)}
+        return sorted(reads)
+
+    def test_filter_records(self, records: List[FastaRecord]) -> None:
+        """
+        Test that repeated sequences are dropped and counted in exact mode.
+        """
+        deduplicator = ReadDeduplicator()
+        kept = list(deduplicator.filter(records))
+        assert [record.id for record in kept[:3]] == ["read0", "read1", "read3"]
+        assert deduplicator.stats.duplicates == 2
+        assert deduplicator.stats.total == len(records)
+        assert deduplicator.stats.unique == len(kept)
+
+    def test_exact_table_grows(self, unique_reads: List[str]) -> None:
+        """
+        Test that the exact mode table starts small and grows with the number of unique reads.
+        """
+        deduplicator = ReadDeduplicator(capacity=10 ** 9)
+        assert len(deduplicator._table) <= 16 * 1024
+        assert not any(deduplicator.is_duplicate(read) for read in unique_reads)
+        assert all(deduplicator.is_duplicate(read) for read in unique_reads)
+        assert len(deduplicator._table) <= 64 * len(unique_reads)
+
+    def test_bloom_false_positive_rate(self, unique_reads: List[str]) -> None:
+        """
+        Test that the Bloom filter drops unique reads at a rate within error_rate when the input fits its capacity.
+        """
+        deduplicator = ReadDeduplicator(mode="bloom", capacity=len(unique_reads), error_rate=0.01)
+        false_positives = sum(deduplicator.is_duplicate(read) for read in unique_reads)
+        assert false_positives / len(unique_reads) <= 0.01
+        assert deduplicator.is_duplicate(unique_reads[0])
+        assert deduplicator.stats.overflow == 0
+
+    def test_bloom_overflow(self, unique_reads: List[str]) -> None:
+        """
+        Test that reads past the Bloom filter capacity are reported, and that a growing filter stays within error_rate.
+        """
+        growing = ReadDeduplicator(mode="bloom", capacity=1000, error_rate=0.01, grow=True)
+        false_positives = sum(growing.is_duplicate(read) for read in unique_reads)
+        assert false_positives / len(unique_reads) <= 0.01
+        assert growing.stats.overflow == growing.stats.unique - 1000
+
+        fixed = ReadDeduplicator(mode="bloom", capacity=1000, error_rate=0.01)
+        with pytest.warns(RuntimeWarning):
+            for read in unique_reads:
+                fixed.is_duplicate(read)
+        assert fixed.stats.overflow > 0
+        assert "past the Bloom filter capacity" in str(fixed.stats)
+
+    def test_read_pairs(self) -> None:
+        """
+        Test that read pairs are duplicates only when both mates match.
+        """
+        deduplicator = ReadDeduplicator()
+        assert not deduplicator.is_duplicate("ATGC", "TTAA")
+        assert not deduplicator.is_duplicate("ATGC", "GGCC")
+        assert deduplicator.is_duplicate("ATGC", "TTAA")
+
+    def test_filter_fastq_deduplication(self, tmp_path: str) -> None:
+        """
+        Test that filter_fastq drops duplicate reads and reports duplication statistics.
+        """
+        input_file = tmp_path / "reads.fastq"
+        reads = [("r1", "ATGCATGC"), ("r2", "GGGGCCCC"), ("r3", "ATGCATGC")]
+        with open(input_file, "w") as f:
+            for name, sequence in reads:
+                f.write(f"@{name}\n{sequence}\n+\n{'I' * len(sequence)}\n")
+
+        output_file = tmp_path / "dedup.fastq"
+        message = filter_fastq(str(input_file), output_filename=str(output_file), deduplicator=ReadDeduplicator())
+
+        with open(output_file) as f:
+            output_names = [line[1:].strip() for line in f if line.startswith("@")]
+        assert output_names == ["r1", "r2"]
+        assert "1 duplicates removed" in message
+
+
 class TestGenscan:
     """
     Test the Genscan functionality.
@@ -128,3 +228,192 @@ class TestGenscan:
         source_code = inspect.getsource(run_genscan)
         pattern = r'url\s*=\s*"http://argonaute\.mit\.edu/cgi-bin/genscanw_py\.cgi"'
         assert re.search(pattern, source_code) is not None
+
+
+class TestRandomForestClassifierCustom:
+    """
+    Test the RandomForestClassifierCustom class.
+    """
+    @pytest.fixture
+    def classification_data(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fixture providing a small two-class dataset.
+        """
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(200, 6))
+        y = (X[:, 0] + X[:, 1] > 0).astype(int)
+        return X, y
+
+    def test_parallel_fit_matches_single_process(self, classification_data: Tuple[np.ndarray, np.ndarray]) -> None:
+        """
+        Test that fitting on shared data in a reused worker pool gives the same forest as n_jobs=1.
+        """
+        X, y = classification_data
+        single = RandomForestClassifierCustom(n_estimators=4, max_depth=3, max_features=3, random_state=1)
+        single.fit(X, y)
+        with RandomForestClassifierCustom(n_estimators=4, max_depth=3, max_features=3, random_state=1) as forest:
+            forest.fit(X, y, n_jobs=2)
+            pool = forest._pool
+            forest.fit(X, y, n_jobs=2)
+            assert forest._pool is pool
+        assert forest._pool is None
+        assert np.allclose(forest.predict_proba(X), single.predict_proba(X))
+
+    def test_shared_array_falls_back_when_shm_is_full(self, monkeypatch: pytest.MonkeyPatch, tmp_path: str) -> None:
+        """
+        Test that the shared copy of X is not written to a folder without enough free space.
+        """
+        def disk_usage(folder: str):
+            return SimpleNamespace(free=0 if folder == "/dev/shm" else 10 ** 12)
+
+        monkeypatch.setattr(custom_random_forest.shutil, "disk_usage", disk_usage)
+        monkeypatch.setattr(custom_random_forest.tempfile, "gettempdir", lambda: str(tmp_path))
+        shared = custom_random_forest._SharedArray(np.ones((10, 3)))
+        try:
+            assert os.path.dirname(shared.filename) == str(tmp_path)
+            assert np.array_equal(shared.open(), np.ones((10, 3)))
+        finally:
+            shared.close()
+
+        with pytest.raises(OSError):
+            custom_random_forest._SharedArray(np.ones((10, 3)), temp_folder="/dev/shm")
+
+    def test_parallel_fit_with_object_labels(self, classification_data: Tuple[np.ndarray, np.ndarray]) -> None:
+        """
+        Test that labels of object dtype are shared as class indices and object features are rejected.
+        """
+        X, y = classification_data
+        labels = np.array(["negative", "positive"], dtype=object)[y]
+        single = RandomForestClassifierCustom(n_estimators=4, max_depth=3, max_features=3, random_state=1).fit(X, labels)
+        with RandomForestClassifierCustom(n_estimators=4, max_depth=3, max_features=3, random_state=1) as forest:
+            forest.fit(X, labels, n_jobs=2)
+        assert forest.classes_ == ["negative", "positive"]
+        assert np.allclose(forest.predict_proba(X), single.predict_proba(X))
+        with pytest.raises(ValueError):
+            custom_random_forest._SharedArray(X.astype(object))
+
+    def test_compiled_forest_matches_trees(self, classification_data: Tuple[np.ndarray, np.ndarray]) -> None:
+        """
+        Test that the compiled forest averages the same probabilities as the fitted sklearn trees.
+        """
+        X, y = classification_data
+        forest = RandomForestClassifierCustom(n_estimators=5, max_depth=4, max_features=3, random_state=2).fit(X, y)
+        expected = np.mean([tree.predict_proba(X[:, feat_ids])
+                            for tree, feat_ids in zip(forest.trees, forest.feat_ids_by_tree)], axis=0)
+        assert np.allclose(forest.predict_proba(X), expected)
+        assert np.allclose(forest.compile().predict_proba(X, chunk_size=16), expected)
+        with pytest.raises(ValueError):
+            forest.predict_proba(X[:, :-1])
+        with pytest.raises(ValueError):
+            forest.predict_proba(X[0])
+
+    def test_compiled_forest_routes_missing_values(self, classification_data: Tuple[np.ndarray, np.ndarray]) -> None:
+        """
+        Test that the compiled forest sends missing values to the same child as the sklearn trees.
+        """
+        X, y = classification_data
+        X = X.copy()
+        X[np.random.default_rng(8).random(X.shape) < 0.2] = np.nan
+        forest = RandomForestClassifierCustom(n_estimators=5, max_features=3, random_state=2).fit(X[:100], y[:100])
+        expected = np.mean([tree.predict_proba(X[:, feat_ids])
+                            for tree, feat_ids in zip(forest.trees, forest.feat_ids_by_tree)], axis=0)
+        assert np.allclose(forest.predict_proba(X), expected)
+
+    def test_save_and_load_forest(self, classification_data: Tuple[np.ndarray, np.ndarray], tmp_path: str) -> None:
+        """
+        Test that a forest loaded from the compiled format predicts like the original one.
+        """
+        X, y = classification_data
+        forest = RandomForestClassifierCustom(n_estimators=5, max_depth=4, max_features=np.int64(3),
+                                              random_state=3).fit(X, y)
+        forest_file = tmp_path / "forest.rfcf"
+        forest.save(forest_file)
+
+        loaded = RandomForestClassifierCustom.load(forest_file)
+        assert isinstance(loaded.compile().value.base, np.memmap)
+        assert loaded.get_params() == forest.get_params()
+        assert np.array_equal(loaded.compile().missing_left, forest.compile().missing_left)
+        assert np.array_equal(loaded.predict_proba(X), forest.predict_proba(X))
+
+    def test_warm_start_matches_single_fit(self, classification_data: Tuple[np.ndarray, np.ndarray]) -> None:
+        """
+        Test that growing a forest in two warm-started steps gives the same trees as a single fit.
+        """
+        X, y = classification_data
+        forest = RandomForestClassifierCustom(n_estimators=3, max_depth=3, max_features=3, random_state=4,
+                                              warm_start=True).fit(X, y)
+        first_tree = forest.trees[0]
+        forest.set_params(n_estimators=6).fit(X, y)
+        full = RandomForestClassifierCustom(n_estimators=6, max_depth=3, max_features=3, random_state=4).fit(X, y)
+
+        assert forest.trees[0] is first_tree
+        assert forest.seeds_by_tree == full.seeds_by_tree
+        assert len(set(forest.seeds_by_tree)) == 6
+        assert np.array_equal(forest.predict_proba(X), full.predict_proba(X))
+
+        forest.set_params(n_estimators=7)
+        with pytest.raises(ValueError):
+            forest.fit(X[y == 0], y[y == 0])
+        assert len(forest.trees) == 6
+
+    def test_oob_score(self, classification_data: Tuple[np.ndarray, np.ndarray]) -> None:
+        """
+        Test that the out-of-bag score is computed with the same result in parallel.
+        """
+        X, y = classification_data
+        forest = RandomForestClassifierCustom(n_estimators=20, max_depth=4, max_features=3, random_state=5,
+                                              oob_score=True).fit(X, y)
+        parallel = RandomForestClassifierCustom(n_estimators=20, max_depth=4, max_features=3, random_state=5,
+                                                oob_score=True).fit(X, y, n_jobs=None)
+        parallel.close()
+
+        assert forest.oob_decision_function_.shape == (len(X), 2)
+        assert 0.7 < forest.oob_score_ <= 1.0
+        assert forest.oob_score_ == parallel.oob_score_
+        forest._set_oob_score(X, y, chunk_size=7)
+        assert np.allclose(forest.oob_decision_function_, parallel.oob_decision_function_, equal_nan=True)
+
+    def test_histogram_engine_matches_exact_on_discrete_features(self) -> None:
+        """
+        Test that the histogram engine grows the same forest as the exact one when every value has its own bin.
+        """
+        rng = np.random.default_rng(6)
+        X = rng.integers(0, 5, size=(300, 4)).astype(float)
+        y = (X[:, 0] + X[:, 1] > 4).astype(int)
+        exact = RandomForestClassifierCustom(n_estimators=5, random_state=7).fit(X, y)
+        hist = RandomForestClassifierCustom(n_estimators=5, random_state=7, engine='hist').fit(X, y)
+
+        tree, feat_ids = hist.trees[0], hist.feat_ids_by_tree[0]
+        assert np.allclose(tree.predict_proba(X[:, feat_ids]), exact.trees[0].predict_proba(X[:, feat_ids]))
+        assert np.allclose(hist.predict_proba(X), exact.predict_proba(X))
+
+    def test_quantile_bins(self) -> None:
+        """
+        Test that features with more distinct values than bins are binned consistently with their edges.
+        """
+        X = np.random.default_rng(9).normal(size=(500, 3))
+        X_binned, bin_edges = custom_random_forest._bin_features(X, max_bins=16, subsample=200)
+
+        assert X_binned.dtype == np.uint8
+        assert bin_edges.shape == (3, 15)
+        for feature in range(3):
+            edges = bin_edges[feature]
+            assert np.all(np.diff(edges[np.isfinite(edges)]) > 0)
+            for bin_id in range(15):
+                assert np.array_equal(X_binned[:, feature] <= bin_id, np.float32(X[:, feature]) <= edges[bin_id])
+
+    def test_histogram_engine_in_parallel(self, classification_data: Tuple[np.ndarray, np.ndarray]) -> None:
+        """
+        Test that the histogram engine grows the same trees in worker processes and with one feature per tree.
+        """
+        X, y = classification_data
+        single = RandomForestClassifierCustom(n_estimators=4, max_features=1, random_state=10, engine='hist',
+                                              max_bins=32).fit(X, y)
+        with RandomForestClassifierCustom(n_estimators=4, max_features=1, random_state=10, engine='hist',
+                                          max_bins=32) as forest:
+            forest.fit(X, y, n_jobs=2)
+
+        expected = np.mean([tree.predict_proba(X[:, feat_ids])
+                            for tree, feat_ids in zip(single.trees, single.feat_ids_by_tree)], axis=0)
+        assert np.allclose(single.predict_proba(X), expected)
+        assert np.array_equal(forest.predict_proba(X), single.predict_proba(X))